@@ -3,15 +3,69 @@
 # Copyright (c) 2019, Jean Landercy
 #
 
-import gc
-
+import micropython
 from micropython import const
-import uio
-import ure
 import utime
 
 import machine
 
+# L76 I2C maximum read size and NMEA line buffer size:
+_READ_N = const(255)
+_BUFFER_N = const(1024)
+
+# NMEA checksum hexadecimal digits (byte to value, invalid digits overflow the checksum byte):
+_HEX = {c: i for i, c in enumerate(b'0123456789ABCDEF')}
+
+# NMEA sentence types carrying time and position fix (fix is read from GPGGA only, see coords and fix):
+_RMC_TYPES = ('GPRMC', 'GNRMC')
+_GGA_TYPES = ('GPGGA',)
+
+# NMEA sentences required to get a fix:
+_FIX_TARGETS = ('GPGGA', 'GPRMC', 'GNRMC')
+
+
+# XOR n first bytes of buffer (native code emitted by Viper):
+@micropython.viper
+def _xor(buf: ptr8, n: int) -> int:
+    checksum = 0
+    for i in range(n):
+        checksum ^= int(buf[i])
+    return checksum
+
+
+# Length of buffer once trailing idle bytes (LF or NUL) are stripped (native code emitted by Viper):
+@micropython.viper
+def _rstrip(buf: ptr8, n: int) -> int:
+    while n > 0 and (int(buf[n - 1]) == 0x0A or int(buf[n - 1]) == 0x00):
+        n -= 1
+    return n
+
+
+# Safely create float or int from a NMEA field (empty and non numeric fields are filtered on their first byte value,
+# '-', '.' or a digit, before paying for an exception):
+def _safe_float(s):
+    if not s:
+        return None
+    c = s[0]
+    if c == 45 or c == 46 or 48 <= c <= 57:
+        try:
+            return float(s)
+        except ValueError:
+            pass
+    return None
+
+
+def _safe_int(s):
+    if not s:
+        return None
+    c = s[0]
+    if c == 45 or 48 <= c <= 57:
+        try:
+            return int(s)
+        except ValueError:
+            pass
+    return None
+
 
 class L76GNSS:
     """
@@ -53,105 +107,70 @@ class L76GNSS:
         self.debug = debug
 
         # GPS Storage:
-        self._set_buffer()
+        self._rxbuf = bytearray(_READ_N)
+        self._rxmv = memoryview(self._rxbuf)
+        self._buf = bytearray(_BUFFER_N)
+        self._mv = memoryview(self._buf)
         self._RTC = machine.RTC()
         self._lastfixon = None
         self._lastframes = dict()
         self._satellites = dict()
-
-        # NMEA Regular Expression:
-        self._NMEA = ure.compile(b"\$(G....)(.*)\*([0-9A-F]*)\r")
-
-        # Time Management:
-        self._watchdog = machine.Timer.Chrono()
+        self._targets = None
 
         # L76 Initialization:
         self.reg = bytearray(1)
         self.i2c.writeto(L76GNSS.GPS_I2CADDR, self.reg)
 
-        # NMEA Synonym registration:
-        oNMEA = [key for key in dir(self) if key.startswith("_GP")]
-        for okey in oNMEA:
-            for ntype in ['N', 'L']:
-                nkey = okey[:2] + ntype + okey[3:]
-                ofunc = getattr(self, okey)
-                # The safe python way makes this closure fails, eg. GLGSV is mapped to PGRMC
-                #setattr(self, nkey, lambda s: ofunc(s))
-                # Does not work because function pointed by okey is not yet defined:
-                #self.__dict__[nkey] = self.__dict__[okey]
-                # This command seems to do the job, we should investigate this issue!
-                # Dynamic programming looks like it is working but may not be accurate 
-                self.__dict__[nkey] = ofunc 
-                print("GPS-NMEA [sentence={}]: Synonym created for {}".format(okey[1:], nkey[1:]))
-        print("GPS-NMEA: Registred sentences are {}".format([key[1:] for key in dir(self) if key.startswith("_G")]))
-
-    def _read(self, n=64):
-        """
-        Read and buffer n bytes from the L76 over the I2C bus:
-        L76 claims to be abvle to read up to n 255 characters from the I2C
-        """
-        self.reg = self.i2c.readfrom(L76GNSS.GPS_I2CADDR, n)
-        return self.reg
+        # NMEA Dispatch table (sentence type to parser):
+        self._parsers = {key[1:]: getattr(self, key) for key in dir(self) if key.startswith("_G") and len(key) == 6}
+        print("GPS-NMEA: Registred sentences are {}".format(sorted(self._parsers)))
 
-    def convert_coords(self, coord, head):
+    def _read(self, n=_READ_N):
         """
-        Convert NMEA coordinates to decimal Lon/Lat coordinates
+        Read n bytes from the L76 over the I2C bus into the preallocated receive buffer:
+        L76 claims to be able to read up to n 255 characters from the I2C
+        A single byte is probed first, if it is an idle byte (L76 has no pending data) the batch read is skipped
+        Trailing idle bytes L76 pads with when drained are stripped
+        Returned memoryview is only valid until next call
         """
-        if coord:
-            coord = (float(coord) // 100) + ((float(coord) % 100) / 60)
-            if head in ('S', 'W'):
-                coord *= -1
-            return coord
+        self.i2c.readfrom_into(L76GNSS.GPS_I2CADDR, self._rxmv[:1])
+        if self._rxbuf[0] == 0x0A or self._rxbuf[0] == 0x00:
+            return self._rxmv[:0]
+        self.i2c.readfrom_into(L76GNSS.GPS_I2CADDR, self._rxmv[1:n])
+        return self._rxmv[:_rstrip(self._rxbuf, n)]
 
-    def _set_buffer(self, line=b''):
+    def convert_coords(self, coord, head):
         """
-        Truncate buffer (Missing truncate function in uio.bytesIO object)
+        Convert NMEA coordinates to decimal Lon/Lat coordinates
         """
-        self._buffer = uio.BytesIO()
-        self._buffer.write(line)
-        gc.collect()
+        if not coord:
+            return None
+        value = float(coord)
+        degrees = value // 100
+        coord = degrees + (value - degrees*100) * (1./60.)
+        return -coord if head in (b'S', b'W') else coord
 
     def checksum(self, payload):
         """
         Compute NMEA Checksum
         """
-        checksum = 0
-        for s in payload:
-            checksum ^= s
-        return checksum
-
-    def _safe_float(self, s):
-        """
-        Safely create float:
-        """
-        try:
-            return float(s)
-        except:
-            return None
-
-    def _safe_int(self, s):
-        """
-        Safely create int:
-        """
-        try:
-            return int(s)
-        except:
-            return None
+        return _xor(payload, len(payload))
 
     def _convert_time(self, s):
         """
-        Convert Time:
+        Convert Time (fixed width ASCII digits hhmmss[.sss] are decoded in place):
         """
         if len(s) == 6:
-            return (int(s[0:2]), int(s[2:4]), int(s[4:6]))
+            return ((s[0] - 48)*10 + s[1] - 48, (s[2] - 48)*10 + s[3] - 48, (s[4] - 48)*10 + s[5] - 48)
         else:
-            return (int(s[0:2]), int(s[2:4]), int(s[4:6]), int(s[7:10])*1000)
+            return ((s[0] - 48)*10 + s[1] - 48, (s[2] - 48)*10 + s[3] - 48, (s[4] - 48)*10 + s[5] - 48,
+                    ((s[7] - 48)*100 + (s[8] - 48)*10 + s[9] - 48)*1000)
 
     def _convert_date(self, s):
         """
-        Convert Date:
+        Convert Date (fixed width ASCII digits ddmmyy are decoded in place):
         """
-        return (2000 + int(s[4:6]), int(s[2:4]), int(s[0:2]))
+        return (2000 + (s[4] - 48)*10 + s[5] - 48, (s[2] - 48)*10 + s[3] - 48, (s[0] - 48)*10 + s[1] - 48)
 
     def _GPGGA(self, payload):
         """
@@ -182,20 +201,23 @@ class L76GNSS:
             13)     (empty field) DGPS station ID number
             CS       *47          the checksum data, always begins with *
         """
-        fields = payload.split(",")[1:]
+        _, time, lat, lat_h, lon, lon_h, fix, sat, hdop, height, units, hog, *_ = payload.split(b",", 12)
         result = {
-            "time": self._convert_time(fields[0]),
-            "lat": self.convert_coords(*fields[1:3]),
-            "lon": self.convert_coords(*fields[3:5]),
-            "fix": int(fields[5]),
-            "sat": int(fields[6]),
-            "hdop": self._safe_float(fields[7]),
-            "height": self._safe_float(fields[8]),
-            "hog": self._safe_float(fields[10]),
-            "units": fields[9]
+            "time": self._convert_time(time),
+            "lat": self.convert_coords(lat, lat_h),
+            "lon": self.convert_coords(lon, lon_h),
+            "fix": int(fix),
+            "sat": int(sat),
+            "hdop": _safe_float(hdop),
+            "height": _safe_float(height),
+            "hog": _safe_float(hog),
+            "units": units.decode()
         }
         return result
 
+    _GNGGA = _GPGGA
+    _GLGGA = _GPGGA
+
     def _GPVTG(self, payload):
         """
         Decode NMEA GPVTG Type ()
@@ -210,14 +232,17 @@ class L76GNSS:
             6-7)    010.2,K      Ground speed, Kilometers per hour
             CS      *48          Checksum
         """
-        fields = payload.split(",")[1:]
+        _, track, _, magnetic, _, _, _, speed, *_ = payload.split(b",", 8)
         result = {
-            "track": self._safe_float(fields[0]),
-            "magnetic": self._safe_float(fields[2]),
-            "speed": self._safe_float(fields[6])
+            "track": _safe_float(track),
+            "magnetic": _safe_float(magnetic),
+            "speed": _safe_float(speed)
         }
         return result
 
+    _GNVTG = _GPVTG
+    _GLVTG = _GPVTG
+
     def _GPGSA(self, payload):
         """
         Decode NMEA GNGSA Type (GPS Dilution Of Precision and active satellites)
@@ -236,11 +261,13 @@ class L76GNSS:
             16)     2.1      Vertical dilution of precision (VDOP)
             CS      *39      the checksum data, always begins with *
         """
-        fields = payload.split(",")[1:]
         result = {
         }
         return result
 
+    _GNGSA = _GPGSA
+    _GLGSA = _GPGSA
+
     def _GPGLL(self, payload):
         """
         Decode NMEA GNGLL Type (Geographic Latitude and Longitude)
@@ -255,11 +282,13 @@ class L76GNSS:
             5)      A            Data Active or V (void)
             CS      *iD          checksum data
         """
-        fields = payload.split(",")[1:]
         result = {
         }
         return result
 
+    _GNGLL = _GPGLL
+    _GLGLL = _GPGLL
+
     def _GPGSV(self, payload, mode='GPGSV'):
         """
         Decode NMEA GPGSV Type (Detailed data on Satelites)
@@ -278,34 +307,41 @@ class L76GNSS:
             x)   +4x3          for up to 4 satellites per sentence
             CS    *75          the checksum data, always begins with *
         """
-        def _sat(seq):
-            if seq[0]:
-                return {
-                    "PRN": seq[0],
-                    "elevation": self._safe_float(seq[1]),
-                    "azimuth": self._safe_float(seq[2]),
-                    "SNR": self._safe_float(seq[3]),
-                    "mode": mode
-                }
-        fields = payload.split(",")[1:]
-        n = (len(fields) - 3) // 4
+        _, _, _, count, *fields = payload.split(b",")
+        n = len(fields) // 4
         # If no satellites, it sends a 0 or 1 after number of satellites:
         # $GLGSV,1,1,00,1*78 
         # $GPGSV,1,1,00,0*65
-        #assert (len(fields) - 3) % 4 == 0
-        sats = list(filter(None, [_sat(fields[i*4+3:(i+1)*4+3]) for i in range(n)]))
+        #assert len(fields) % 4 == 0
+        sats = []
+        satellites = self._satellites
+        safe_float = _safe_float
+        for j in range(0, n*4, 4):
+            prn = fields[j]
+            if prn:
+                prn = prn.decode()
+                sat = {
+                    "PRN": prn,
+                    "elevation": safe_float(fields[j+1]),
+                    "azimuth": safe_float(fields[j+2]),
+                    "SNR": safe_float(fields[j+3]),
+                    "mode": mode
+                }
+                sats.append(sat)
+                satellites[prn] = sat
         result = {
-            "count": self._safe_int(fields[2]),
+            "count": _safe_int(count),
             "satelites": sats
         }
-        self._satellites.update({sat['PRN']: sat for sat in sats})
         return result
 
-    # def _GLGSV(self, payload):
-    #     """
-    #     Decode NMEA GLGSV Type (Synonym for GPGSV)
-    #     """
-    #     return self._GPGSV(payload, mode='GLGSV')
+    _GNGSV = _GPGSV
+
+    def _GLGSV(self, payload):
+        """
+        Decode NMEA GLGSV Type (Synonym for GPGSV)
+        """
+        return self._GPGSV(payload, mode='GLGSV')
 
     def _GPRMC(self, payload):
         """
@@ -325,54 +361,52 @@ class L76GNSS:
             9-10)   003.1,W      Magnetic Variation
             CS      *6A          The checksum data, always begins with *
         """
-        fields = payload.split(",")[1:]
+        _, time, status, lat, lat_h, lon, lon_h, speed, track, date, magnetic, direction, *_ = payload.split(b",", 12)
         result = {
-            "status": fields[1],
-            "lat": self.convert_coords(*fields[2:4]),
-            "lon": self.convert_coords(*fields[4:6]),
-            "time": self._convert_time(fields[0]),
-            "date": self._convert_date(fields[8]),
-            "speed": self._safe_float(fields[6]),
-            "track": self._safe_float(fields[7]),
-            "magentic": self._safe_float(fields[9]),
-            "direction": fields[10]
+            "status": status.decode(),
+            "lat": self.convert_coords(lat, lat_h),
+            "lon": self.convert_coords(lon, lon_h),
+            "time": self._convert_time(time),
+            "date": self._convert_date(date),
+            "speed": _safe_float(speed),
+            "track": _safe_float(track),
+            "magentic": _safe_float(magnetic),
+            "direction": direction.decode()
         }
         if result['speed']:
             result['speed'] *= 1.852
         return result
 
-    # def _GNRMC(self, payload):
-    #     """
-    #     Synonym for GPRMC
-    #     """
-    #     return self._GPRMC(payload)
+    _GNRMC = _GPRMC
+    _GLRMC = _GPRMC
 
     def parse(self, sentence):
         """
-        Parse NMEA Sentence
+        Parse NMEA Sentence:
+        Frames are strictly formatted as $<type:5>,<payload>*<checksum:2><CR> and are sliced by index
+        Return a (type, integrity, result) tuple or None if the line is not a NMEA frame
+        or is not consumed (no parser registered or not targeted by the current read)
         """
-        m = self._NMEA.match(sentence)
-        if m:
+        star = sentence.rfind(b'*')
+        if sentence[:2] == b'$G' and sentence[-1:] == b'\r' and star >= 6 and len(sentence) - star == 4:
 
-            # Map frame & perform checksum:
-            data = dict()
-            data['raw'] = m.group(0)
-            data['type'] = m.group(1).decode()
-            data['payload'] = m.group(2).decode()
-            data['checksum'] = int(m.group(3).decode(), 16)
-            data['checked'] = self.checksum(m.group(0).split(b'*')[0].replace(b'$', b''))
-            data['integrity'] = (data['checksum'] == data['checked'])
+            # Skip sentences we don't consume before any checksum work (time/fix sentences are always needed):
+            typ = sentence[1:6].decode()
+            parser = self._parsers.get(typ)
+            if parser is None:
+                return None
+            targets = self._targets
+            if targets is not None and typ not in targets and typ not in _RMC_TYPES and typ not in _GGA_TYPES:
+                return None
 
-            # Parse payload:
-            try:
-                key = "_{}".format(data['type'])
-                parser = getattr(self, key)
-                data['result'] = parser(data['payload'])
+            # Perform checksum:
+            checksum = (_HEX.get(sentence[star + 1], 0x100) << 4) | _HEX.get(sentence[star + 2], 0x100)
+            integrity = (checksum == self.checksum(memoryview(sentence)[1:star]))
 
-            except (KeyError, AttributeError):
-                data['result'] = None
+            # Slice and parse payload as bytes (only when checksum is valid):
+            result = parser(sentence[6:star]) if integrity else None
 
-            return data
+            return typ, integrity, result
 
     @staticmethod
     def _to_utime(rtctime):
@@ -412,82 +446,129 @@ class L76GNSS:
 
         matches = set()
         targets = set(targets)
+
+        # Untargeted sentences filter is always released, even if reading is interrupted:
+        try:
+            # Let parse skip untargeted sentences (no targets means parse everything):
+            self._targets = targets or None
         
-        # Start watchdog:
-        self._watchdog.reset()
-        self._watchdog.start()
-
-        # L76 read loop w/ timeout:
-        i = 0
-        self._set_buffer()
-        while (timeout is None) or (self._watchdog.read() <= timeout):
-
-            # Read from L76 and buffer frames no carriage return strip as it prevent some sentence to be detected:
-            s = self._read()
-            if s:
-                self._buffer.write(s)
-                if self.debug or debug:
-                    print("GPS-STREAM [{:.6f},{}/{}]: {}".format(self._watchdog.read(), len(s), len(self._buffer.getvalue()), s))
-
-            # Iterate buffered lines:
-            line = b''
-            self._buffer.seek(0)
-            for line in self._buffer:
-                i += 1                
-                # Parse Line:
-                #res = self.parse(line) # Make it crash because MicroPython cannot reraise
-                try:
-                    res = self.parse(line)
-
-                except Exception as err:
-                    print("GPS-STREAM ERROR [{}]: {}({})".format(i, err, line))
-
-                else:
-                    # Line is a valid NMEA sentence:
-                    if res:
-
-                        if self.debug or debug:
-                            print("GPS-NMEA [{},{type:},{count:}]: {raw:}".format(i, count=len(line), **res))
+            # Bind hot path attributes to locals:
+            debug_on = self.debug or debug
+            ticks_ms = utime.ticks_ms
+            ticks_diff = utime.ticks_diff
+            sleep_ms = utime.sleep_ms
+            _read = self._read
+            parse = self.parse
+            buf = self._buf
+            mv = self._mv
+
+            # Start watchdog (deadline computed once):
+            t0 = ticks_ms()
+            if timeout is not None:
+                deadline = utime.ticks_add(t0, int(timeout*1000))
+
+            # L76 read loop w/ timeout:
+            i = 0
+            w = 0
+            empty_reads = 0
+            done = False
+            while (timeout is None) or (ticks_diff(deadline, ticks_ms()) >= 0):
+
+                # Read from L76 and append frames at the write cursor:
+                s = _read()
+                if not s:
+                    # L76 is idle (nothing new to scan), back off progressively up to 50ms:
+                    empty_reads += 1
+                    sleep_ms(min(50, 5*empty_reads))
+                    continue
+                empty_reads = 0
+                if w + len(s) > len(buf):
+                    # Drop stalled data that never completed into a sentence:
+                    w = 0
+                buf[w:w + len(s)] = s
+                w += len(s)
+                if debug_on:
+                    print("GPS-STREAM [{:.6f},{}/{}]: {}".format(ticks_diff(ticks_ms(), t0)/1000, len(s), w, bytes(s)))
+
+                # Iterate buffered lines (bytearray has no find method in MicroPython, scan a single snapshot):
+                data = bytes(mv[:w])
+                start = 0
+                while True:
+                    start = data.find(b'$', start)
+                    if start < 0:
+                        start = w
+                        break
+                    end = data.find(b'\r', start)
+                    if end < 0:
+                        break
+                    line = data[start:end + 1]
+                    start = end + 1
+                    i += 1
+                    # Parse Line:
+                    #res = self.parse(line) # Make it crash because MicroPython cannot reraise
+                    try:
+                        res = parse(line)
+
+                    except Exception as err:
+                        print("GPS-STREAM ERROR [{}]: {}({})".format(i, err, line))
+
+                    else:
+                        # Line is a valid NMEA sentence:
+                        if res:
+                            typ, integrity, result = res
+
+                            if debug_on:
+                                print("GPS-NMEA [{},{},{}]: {}".format(i, typ, len(line), line))
                         
-                        # NMEA Sentence has correct check sum:
-                        if res['integrity']:
-
-                            if (self.debug or debug) and res['result']:
-                                print("GPS-DATA [{}]: {}".format(i, res['result']))
-
-                            # Store Results:
-                            self._lastframes[res['type']] = res
-                            matches.update([res['type']])
-
-                            # Is time fixed?
-                            if res['type'] in ('GPRMC', 'GNRMC') and res['result'] is not None:
-                                self._set_RTC(res['result'])
-
-                            # Is position fixed?
-                            if res['type'] in ('GPGGA',) and res['result']['lat'] is not None:
-                                self._lastfixon = self._RTC.now()
-
-                        else:
-                            print("GPS-NMEA CHECKSUM [{},{checked:X}/{checksum:X}]: {raw:}".format(i, **res))
-
-            # Reset buffer with trailing data:
-            self._set_buffer(line)
-
-            if fix and ('GPGGA' in matches) and not self._lastframes['GPGGA']['result']['lon'] is None:
-                print("GPS-FIX: {}".format(self._lastframes['GPGGA']['result']))
-                break
-
-            # Break read loop (any mode):
-            if not fix and (mode == 'any') and len(matches.intersection(targets))>0:
-                break
-            
-            # Break read loop (all mode):
-            if not fix and (mode == 'all') and matches.issuperset(targets):
-                break
+                            # NMEA Sentence has correct check sum:
+                            if integrity:
+
+                                if debug_on and result:
+                                    print("GPS-DATA [{}]: {}".format(i, result))
+
+                                # Store Results:
+                                self._lastframes[typ] = result
+                                matches.add(typ)
+
+                                # Is time fixed?
+                                if typ in _RMC_TYPES and result is not None:
+                                    self._set_RTC(result)
+
+                                # Is position fixed?
+                                if typ in _GGA_TYPES and result['lat'] is not None:
+                                    self._lastfixon = utime.ticks_ms()
+
+                                # Stop scanning as soon as targets are reached (without targets, read until timeout):
+                                if fix:
+                                    done = ('GPGGA' in matches) and self._lastframes['GPGGA']['lon'] is not None
+                                elif not targets:
+                                    done = False
+                                elif mode == 'any':
+                                    done = len(matches.intersection(targets)) > 0
+                                else:
+                                    done = matches.issuperset(targets)
+                                if done:
+                                    break
+
+                            else:
+                                print("GPS-NMEA CHECKSUM [{},{}]: {}".format(i, typ, line))
+
+                # Move trailing data at the beginning of the buffer (copied from the snapshot, never overlapping):
+                buf[:w - start] = data[start:w]
+                w -= start
+
+                # Break read loop (fix, any or all mode):
+                if done:
+                    if fix:
+                        print("GPS-FIX: {}".format(self._lastframes['GPGGA']))
+                    break
         
-        # Timeout reason:
-        else:
-            print("GPS-FIX [timeout={}s]: {} {} in {}, missing {}".format(self._watchdog.read(), mode, targets, matches, targets.difference(matches)))
+            # Timeout reason:
+            else:
+                print("GPS-FIX [timeout={}s]: {} {} in {}, missing {}".format(ticks_diff(ticks_ms(), t0)/1000, mode, targets, matches, targets.difference(matches)))
+
+        finally:
+            self._targets = None
 
     def start(self, debug=False):
         """
@@ -497,39 +578,37 @@ class L76GNSS:
 
     def is_fixed(self, eps=5*60):
         """
-        Check if position is fixed ()
+        Check if position is fixed (last fix received less than eps seconds ago, ms resolution)
         """
         if self._lastfixon is None:
             return False
         else:
-            tnow = utime.mktime(self._to_utime(self._RTC.now()))
-            tlf = utime.mktime(self._to_utime(self._lastfixon))
-            return abs(tnow - tlf) < eps
+            return 0 <= utime.ticks_diff(utime.ticks_ms(), self._lastfixon) < eps*1000
 
     def fix(self, debug=False, timeout=300.0, retry=5):
         """
         Get a GPS fix in a given timeout with retries
         """
         for i in range(retry):
-            self.read(timeout=timeout, targets=['GPGGA', 'GPRMC', 'GNRMC'], mode='all', fix=True, debug=debug)
+            self.read(timeout=timeout, targets=_FIX_TARGETS, mode='all', fix=True, debug=debug)
             print("GPS-FIX [try={}/{}]: Fixed = {}".format(i+1, retry, self.is_fixed()))
             if self.is_fixed():
                 break
             
-        return self._lastframes['GPGGA']['result']
+        return self._lastframes['GPGGA']
 
     def coords(self, timeout=1., debug=False, refresh=False):
         """
-        Read coordinates from L76
+        Return last coordinates read from L76 (only read again on explicit refresh)
         """
-        if refresh or self._lastframes.get('GPGGA', {}).get('result') is None:
+        if refresh:
             self.read(timeout=timeout, debug=debug, targets=['GPGGA'])
-        return self._lastframes.get('GPGGA', {}).get('result')
+        return self._lastframes.get('GPGGA')
 
     def speed(self, timeout=1., debug=False, refresh=False):
         """
-        Read speed from L76
+        Return last speed read from L76 (only read again on explicit refresh)
         """
-        if refresh or self._lastframes.get('GPVTG', {}).get('result') is None:
+        if refresh:
             self.read(timeout=timeout, debug=debug, targets=['GPVTG'])
-        return self._lastframes.get('GPVTG', {}).get('result')
+        return self._lastframes.get('GPVTG')
@@ -84,22 +84,35 @@ class LIS2HH12:
         self.acceleration()
 
     def acceleration(self):
-        x = self.i2c.readfrom_mem(ACC_I2CADDR , ACC_X_L_REG, 2)
-        self.x = struct.unpack('<h', x)
-        y = self.i2c.readfrom_mem(ACC_I2CADDR , ACC_Y_L_REG, 2)
-        self.y = struct.unpack('<h', y)
-        z = self.i2c.readfrom_mem(ACC_I2CADDR , ACC_Z_L_REG, 2)
-        self.z = struct.unpack('<h', z)
+        # single burst read of X, Y and Z (register address auto increments)
+        xyz = self.i2c.readfrom_mem(ACC_I2CADDR , ACC_X_L_REG, 6)
+        x, y, z = struct.unpack('<hhh', xyz)
+        self.x = (x,)
+        self.y = (y,)
+        self.z = (z,)
         _mult = self.SCALES[self.full_scale] / ACC_G_DIV
         return (self.x[0] * _mult, self.y[0] * _mult, self.z[0] * _mult)
 
     def roll(self):
         x,y,z = self.acceleration()
-        rad = math.atan2(-x, z)
-        return (180 / math.pi) * rad
+        return self._roll(x, y, z)
 
     def pitch(self):
         x,y,z = self.acceleration()
+        return self._pitch(x, y, z)
+
+    def read_all(self):
+        # acceleration, roll and pitch from a single sample
+        x,y,z = self.acceleration()
+        return (x, y, z), self._roll(x, y, z), self._pitch(x, y, z)
+
+    @staticmethod
+    def _roll(x, y, z):
+        rad = math.atan2(-x, z)
+        return (180 / math.pi) * rad
+
+    @staticmethod
+    def _pitch(x, y, z):
         rad = -math.atan2(y, (math.sqrt(x*x + z*z)))
         return (180 / math.pi) * rad
 
@@ -1,5 +1,7 @@
 
 import struct
+import micropython
+import ubinascii
 
 import pycom
 import utime
@@ -8,164 +10,217 @@ import machine
 from pytrack import Pytrack
 from L76GNSS import L76GNSS
 from LIS2HH12 import LIS2HH12
+from lora import poll_events, wait_tx
+
+# LoRa payload layout (status, time, longitude, latitude, height, precision):
+_PAYLOAD_FORMAT = "<bIiihh"
+_PAYLOAD_BUFFER = bytearray(struct.calcsize(_PAYLOAD_FORMAT))
+
+# Log level (0: errors only, 1: application events, 2: every frame encoded and sent):
+_LOG_LEVEL = 1
+
+
+def set_log_level(level):
+    """
+    Set application log level (errors are always printed)
+    """
+    global _LOG_LEVEL
+    _LOG_LEVEL = level
+
+
+# NMEA sentences read on each measure:
+_GPS_TARGETS = ('GPGGA', 'GPVTG')
+
+
+# Seconds of the day from GPS time (native code emitted by Viper):
+@micropython.viper
+def _seconds(h: int, m: int, s: int) -> int:
+    return (h*60 + m)*60 + s
+
+
+# Boards and Sensors (created on first use, I2C bus is not powered at import):
+_py = None
+_acc = None
+_gps = None
+
+
+def _default_board():
+    global _py
+    if _py is None:
+        _py = Pytrack()
+    return _py
+
+
+def _default_gps(board):
+    global _gps
+    if _gps is None:
+        _gps = L76GNSS(board)
+    return _gps
+
+
+def _default_acc(board):
+    global _acc
+    if _acc is None:
+        _acc = LIS2HH12(board)
+    return _acc
 
-# Boards and Sensors:
-_py = Pytrack()
-_acc = LIS2HH12(_py)
-_gps = L76GNSS(_py)
 
 class Application:
     """
     Pytrack basic application for GPS logging
     """
 
-    def __init__(self, sock=None, lora=None, board=_py, gps=_gps, acc=_acc):
+    def __init__(self, sock=None, lora=None, board=None, gps=None, acc=None, save_period=10):
         """
         Initialiaze application
         """
         
-        # Components:
-        self._board = board
-        self._gps = gps
-        self._acc = acc
-        self._sock = sock
-        self._lora = lora
+        # Components (plain attributes):
+        self.board = board if board is not None else _default_board()
+        self.gps = gps if gps is not None else _default_gps(self.board)
+        self.acc = acc if acc is not None else _default_acc(self.board)
+        # Socket is set non-blocking once by lora.connect (recv is polled in the loop),
+        # it is never switched back per send:
+        # https://forum.pycom.io/topic/3780/lorawan-frames-counter-does-not-work-after-deepsleep-if-socket-is-set-to-non-blocking/2
+        self.sock = sock
+        self.lora = lora
 
         # Timers:
         self._measure_clock = machine.Timer.Chrono()
         self._lora_clock = machine.Timer.Chrono()
 
-        # States:
+        # States (last measure is buffered for emission):
         self._id = 0
         self._last = None
 
-        print("APP: Initialiazed")
-
-    @property
-    def board(self):
-        return self._board
-
-    @property
-    def gps(self):
-        return self._gps
-
-    @property
-    def acc(self):
-        return self._acc
-
-    @property
-    def sock(self):
-        return self._sock
+        # LoRa state is saved to NVRAM every few frames (flash wear) and before sleeping:
+        self._save_period = save_period
+        self._frames_since_save = 0
 
-    @property
-    def lora(self):
-        return self._lora
+        if _LOG_LEVEL >= 1:
+            print("APP: Initialiazed")
 
     def measure(self, timeout=5.0, debug=False):
         """
         Measure available data on the board.
         """
-        data = dict()
-
         # Tag measure:
-        data['id'] = self._id
-        self._id += 1
+        i = self._id
+        self._id = i + 1
+        data = {'id': i}
         
-        # Read GPS (heavy duty cycle):
-        self.gps.read(timeout=timeout, targets=['GPGGA', 'GPVTG'], debug=debug)
+        # Read GPS (heavy duty cycle), unless the last fix is from the previous 1Hz L76 output:
+        if not self.gps.is_fixed(eps=1.5):
+            self.gps.read(timeout=timeout, targets=_GPS_TARGETS, debug=debug)
         data['coords'] = self.gps.coords(debug=debug)
         data['speed'] = self.gps.speed(debug=debug)
 
-        # Read Sensor (quicker):
-        data['acceleration'] = self.acc.acceleration()
-        data['roll'] = self.acc.roll()
-        data['pitch'] = self.acc.pitch()
+        # Read Sensor (quicker, roll and pitch are computed from the same sample):
+        data['acceleration'], data['roll'], data['pitch'] = self.acc.read_all()
 
         if debug:
             print("APP-MEASURE [id={}]: {}".format(data['id'], data))
 
+        # Buffer measure:
+        self._last = data
+
         return data
 
-    def send(self, payload, save=False):
+    def save(self):
+        """
+        Save LoRa state (frame counters) to NVRAM if defined
+        """
+        if self.lora is not None:
+            self.lora.nvram_save()
+            self._frames_since_save = 0
+            if _LOG_LEVEL >= 1:
+                print("APP-SAVE: LoRa state saved")
+
+    def send(self, payload):
         """
         Send payload through socket if defined (Uplink)
         """
         if self.sock is None:
             print("APP-SEND ERROR: Cannot send, no socket defined")
         else:
-            # https://forum.pycom.io/topic/3780/lorawan-frames-counter-does-not-work-after-deepsleep-if-socket-is-set-to-non-blocking/2
-            #self.sock.setblocking(True)
             n = self.sock.send(payload)
-            #self.sock.setblocking(False) # Maybe linked in Downlin issue
-            print("APP-SENT [size={}]: {}".format(n, payload))
-            # Save LoRa state:
-            if save:
-                self.lora.nvram_save()
+            if _LOG_LEVEL >= 2:
+                print("APP-SENT [size={}]: {}".format(n, ubinascii.hexlify(payload)))
+            # Save LoRa state (batched):
+            self._frames_since_save += 1
+            if self._frames_since_save >= self._save_period:
+                self.save()
             return n
 
-    def recv(self, size=64, debug=False, save=False):
+    def recv(self, size=64, debug=False):
         """
         Receive payload through socket if defined (Downlink)
+        Return (payload, port) or (None, 0) without socket
         """
         if self.sock is None:
             print("APP-RECV ERROR: Cannot receive, no socket defined")
+            return None, 0
         else:
             # Checkout for Downlink:
             payload, port = self.sock.recvfrom(size)
-            if (port > 0) or debug:
+            if (port > 0 and _LOG_LEVEL >= 1) or debug:
                 print("APP-RECV [size={}, port={}]: {} ".format(len(payload), port, payload))
-            # Save LoRa state:
-            if save:
-                self.lora.nvram_save()
             return payload, port
 
     @staticmethod
+    @micropython.native
     def encode(data):
         """
-        Encode data into application payload:
+        Encode data into application payload (bytes):
         """
-        rep = data.copy()
+        # Bind coordinates once:
+        c = data['coords']
+        t = c['time']
+        lat = c['lat']
         # Convert Metrics:
-        t = data['coords']['time']
-        s = int(data["coords"]["lat"] is None) | (data['coords']['fix'] << 1)
-        d = ((t[0]*60+t[1])*60+t[2])
-        lon = round((data['coords']['lon'] or 1e3)*1e6)
-        lat = round((data['coords']['lat'] or 1e3)*1e6)
-        h = round((data['coords']['height'] or 0))
-        dop = round((data["coords"]["hdop"] or 0)*10)
+        s = int(lat is None) | (c['fix'] << 1)
+        d = _seconds(t[0], t[1], t[2])
+        lon = round((c['lon'] or 1e3)*1e6)
+        lat = round((lat or 1e3)*1e6)
+        h = round((c['height'] or 0))
+        dop = round((c['hdop'] or 0)*10)
         # Encode Metrics:
-        payload = b''
-        payload += struct.pack("<b", s)
-        payload += struct.pack("<I", d)
-        payload += struct.pack("<I", lon)
-        payload += struct.pack("<I", lat)
-        payload += struct.pack("<h", h)
-        payload += struct.pack("<h", dop)
-        rep['payload'] = payload
-        print("APP-ENCODE [size={}]: {}".format(len(rep['payload']), rep))
-        return rep
+        struct.pack_into(_PAYLOAD_FORMAT, _PAYLOAD_BUFFER, 0, s, d, lon, lat, h, dop)
+        payload = bytes(_PAYLOAD_BUFFER)
+        if _LOG_LEVEL >= 2:
+            print("APP-ENCODE [id={},size={}]".format(data['id'], len(payload)))
+        return payload
 
     def emit(self, timeout=15.0, debug=False):
         """
-        Emit a measure through socket
+        Emit latest buffered measure through socket (measure first if none is available,
+        timeout only applies to that measure)
+        Return sent size or None if nothing was sent (no position fix to report)
         """
         try:
-            m = self.measure(timeout=timeout)
-            rep = self.encode(m)
-            n = self.send(rep['payload'])
+            m = self._last if self._last is not None else self.measure(timeout=timeout)
+            # Don't pay radio airtime for a measure without position fix:
+            if m['coords'] is None or m['coords']['lat'] is None:
+                if _LOG_LEVEL >= 1:
+                    print("APP-EMIT [id={}]: Skipped, no fix".format(m['id']))
+                return None
+            payload = self.encode(m)
+            n = self.send(payload)
             if debug:
-                print("APP-EMIT [size={}]: {}".format(n, rep))
+                print("APP-EMIT [id={},size={}]: {}".format(m['id'], n, m))
+            return n
         except OSError as err:
             print("APP-EMIT ERROR: {}".format(err))
 
-    def start(self, measure_period=1, lora_period=20, gps_timeout=5*60, gps_retry=5,
+    def start(self, measure_period=1, measure_timeout=5.0, lora_period=20, lora_retry=5, gps_timeout=5*60, gps_retry=5,
               mode='eco', dryrun=False, debug=False, color=0x007f00):
         """
         Start application
         """
 
         assert mode in ('eco', 'power')
-        print("APP [mode={}]: Started".format(mode))
+        if _LOG_LEVEL >= 1:
+            print("APP [mode={}]: Started".format(mode))
 
         # Get a Fix from GPS:
         if not dryrun:
@@ -175,11 +230,17 @@ class Application:
         if mode == 'eco':
 
             #self.measure(debug=False)
+            n = None
             if not dryrun:
-                self.emit(timeout=30.0)
-            
-            # More or less safely shutdown the device:
+                n = self.emit(timeout=30.0)
+
+            # Uplink is queued on the non-blocking socket, wait for it before saving the frame counter:
+            if n is not None and self.lora is not None:
+                wait_tx(self.lora)
+
+            # More or less safely shutdown the device (LoRa state saved right before sleeping):
             utime.sleep(1.)
+            self.save()
             machine.deepsleep(1000*lora_period)
 
         # Mode Power:
@@ -191,28 +252,46 @@ class Application:
             self._lora_clock.reset()
             self._lora_clock.start()
 
-            # Application Loop
-            while True:
+            # Emit sooner when the last measure was skipped (no fix):
+            period = lora_period
 
-                # Class C: Get Downlink Payload if any (eg.: TWljcm9QeXRob24=)
-                downlink, port = self.recv(debug=debug)
-                if downlink:
-                    # Branch command logic here...
-                    pass
+            # Application Loop (LoRa state is saved whatever the way it ends):
+            try:
+                while True:
 
-                # LoRa Cycle:
-                if self._lora_clock.read() >= lora_period:
+                    # Log LoRa events recorded by the callback:
+                    if self.lora is not None:
+                        poll_events(self.lora)
 
-                    # Blink (light on):
-                    pycom.rgbled(color)
+                    # Class C: Get Downlink Payload if any (eg.: TWljcm9QeXRob24=)
+                    if self.sock is not None:
+                        downlink, port = self.recv(debug=debug)
+                        if downlink:
+                            # Branch command logic here...
+                            pass
+
+                    # Measure Cycle (feeds the buffer emit consumes):
+                    if not dryrun and self._measure_clock.read() >= measure_period:
+                        self.measure(timeout=measure_timeout, debug=debug)
+                        self._measure_clock.reset()
+
+                    # LoRa Cycle:
+                    if self._lora_clock.read() >= period:
+
+                        # Blink (light on):
+                        pycom.rgbled(color)
                     
-                    if dryrun:
-                        # Send a heavy dummy packet:
-                        self.send(b'\x02'*56)
-                    else:
-                        self.emit(timeout=90.)
+                        if dryrun:
+                            # Send a heavy dummy packet:
+                            n = self.send(b'\x02'*56)
+                        else:
+                            n = self.emit(timeout=measure_timeout)
+
+                        period = lora_period if n is not None else lora_retry
+                        self._lora_clock.reset()
 
-                    self._lora_clock.reset()
+                        # Blink (light off):
+                        pycom.rgbled(0x000000)
 
-                    # Blink (light off):
-                    pycom.rgbled(0x000000)
+            finally:
+                self.save()
@@ -1,38 +1,196 @@
 #!/usr/bin/env python
 
 import os
+import json
 import utime
 import socket
-import binascii
+import machine
 
+from micropython import const
 from network import LoRa
 import ubinascii
 
+# OTAA join total waiting time (s) before going to deepsleep and retry (ms):
+JOIN_TIMEOUT = 120.
+JOIN_RETRY_SLEEP_MS = const(15*60*1000)
+
+# OTAA join accept polling slice (ms):
+JOIN_POLL_MS = const(100)
+
+# LoRaWAN settings (data rate, fake battery level) and radio constants looked up once:
+_SO_DR = const(5)
+_BATTERY = const(127)
+_LORAWAN = LoRa.LORAWAN
+_EU868 = LoRa.EU868
+
+# LoRa radio shared between device EUI detection and connection (initialized once):
+_lora = None
+_lora_class = None
+_mac = None
+
+# LoRa events recorded by event_handler and bound callback (radio, handler):
+_event_flags = [0]
+_callback = None
+
+# Radio stats (SPI reads) are fetched at most every period (ms):
+_STATS_PERIOD_MS = const(5000)
+_stats_ticks = None
+
+def get_lora(device_class=LoRa.CLASS_C):
+    """
+    Return the LoRa radio in LORAWAN mode, it is only (re)initialized when missing or when device class changes
+    """
+    global _lora, _lora_class
+    if _lora is None:
+        _lora = LoRa(mode=_LORAWAN, region=_EU868, device_class=device_class)
+    elif _lora_class != device_class:
+        _lora.init(mode=_LORAWAN, region=_EU868, device_class=device_class)
+    _lora_class = device_class
+    return _lora
+
+def get_mac_hex():
+    """
+    Return device EUI as upper hexadecimal string (cached)
+    """
+    global _mac
+    if _mac is None:
+        _mac = ubinascii.hexlify(get_lora().mac()).decode().upper()
+    return _mac
 
 def generate_keys():
     """"
     Generate random Application EUI and Key:
     """
-    appeui = ubinascii.hexlify(os.urandom(8)).decode().upper()
-    appkey = ubinascii.hexlify(os.urandom(16)).decode().upper()
+    keys = ubinascii.hexlify(os.urandom(24)).decode().upper()
+    appeui = keys[:16]
+    appkey = keys[16:]
     print("LORA-KEYS [EUI={}]: Application keys generated".format(appeui))
     return {"appeui": appeui, "appkey": appkey}
 
+def load_creds(path, eid):
+    """
+    Load application keys for device EUI from JSON file,
+    the file is only written when it is missing and keys are generated for this device
+    Return a (keys, generated) tuple (keys is None if device is not registered),
+    a session restored from NVRAM is stale when keys were just generated
+    """
+    try:
+        return read_creds(path, eid), False
+    except OSError:
+        keys = generate_keys()
+        creds = {eid: keys}
+        print("LORA-KEYS: {}".format(json.dumps(creds)))
+        with open(path, 'w') as fh:
+            json.dump(creds, fh)
+        return keys, True
+
+def read_creds(path, eid):
+    """
+    Read a single device entry from JSON credentials file without parsing other devices
+    Return device keys or None if device is not registered
+    """
+    with open(path) as fh:
+        text = fh.read()
+    i = text.find('"{}"'.format(eid))
+    if i < 0:
+        return None
+    start = text.find('{', i)
+    end = text.find('}', start)
+    return json.loads(text[start:end + 1])
+
 def event_handler(lora):
-    events = lora.events()
-    if events & LoRa.RX_PACKET_EVENT:
-        pass
-    if events & LoRa.TX_PACKET_EVENT:
-        pass
-    print("LORA-EVENT [type={}]: clock={} stats={}".format(events, utime.ticks_us(), lora.stats()))
+    """
+    Record LoRa events raised (fast path, no I/O in the callback), see poll_events
+    """
+    _event_flags[0] |= lora.events()
+
+def poll_events(lora):
+    """
+    Log and clear LoRa events recorded since last call (slow path, out of the callback)
+    Radio stats are only read and logged once per stats period
+    Return recorded events mask
+    """
+    global _stats_ticks
+    state = machine.disable_irq()
+    events = _event_flags[0]
+    _event_flags[0] = 0
+    machine.enable_irq(state)
+    if events:
+        now = utime.ticks_ms()
+        if _stats_ticks is None or utime.ticks_diff(now, _stats_ticks) >= _STATS_PERIOD_MS:
+            _stats_ticks = now
+            print("LORA-EVENT [type={}]: clock={} stats={}".format(events, now, lora.stats()))
+        else:
+            print("LORA-EVENT [type={}]: clock={}".format(events, now))
+    return events
+
+def wait_tx(lora, timeout_ms=10000):
+    """
+    Wait until event_handler records the end of an uplink (TX packet event) or timeout
+    Return True if uplink was sent
+    """
+    deadline = utime.ticks_add(utime.ticks_ms(), timeout_ms)
+    while utime.ticks_diff(deadline, utime.ticks_ms()) > 0:
+        if poll_events(lora) & LoRa.TX_PACKET_EVENT:
+            return True
+        utime.sleep_ms(JOIN_POLL_MS)
+    return False
+
+def _open_socket(lora, on_event):
+    """
+    Bind event callback and create application socket on a joined LoRa radio
+    """
+    global _callback
+
+    # Bind Event Callback (once per radio and handler):
+    if on_event is not None and _callback != (lora, on_event):
+        lora.callback(trigger=(LoRa.RX_PACKET_EVENT | LoRa.TX_PACKET_EVENT), handler=on_event)
+        _callback = (lora, on_event)
+
+    # Fake battery level (test):
+    lora.set_battery_level(_BATTERY)
+
+    # create a LoRa socket
+    sock = socket.socket(socket.AF_LORA, socket.SOCK_RAW)
+
+    # set the LoRaWAN data rate
+    sock.setsockopt(socket.SOL_LORA, socket.SO_DR, _SO_DR)
+
+    # Confirmed uplink
+    sock.setsockopt(socket.SOL_LORA, socket.SO_CONFIRMED, False)
 
-def connect(appeui, appkey, force=False, max_retry=20, grace_period=2.5):
+    # make the socket non-blocking for the application, connect only blocks for the join confirmation
+    # (because if there's no data received it will block forever...)
+    sock.setblocking(False)
+
+    return sock
+
+def fast_resume(device_class=LoRa.CLASS_C, on_event=event_handler, lora_obj=None):
+    """
+    Resume LoRa session saved in NVRAM (eg. after deepsleep) without any join or uplink
+    Return (socket, lora) or None if no joined session was restored
+    """
+    lora = lora_obj if lora_obj is not None else get_lora(device_class)
+    lora.nvram_restore()
+    if not lora.has_joined():
+        return None
+    print('LORA-OTAA: Session resumed from NVRAM')
+    return _open_socket(lora, on_event), lora
+
+def connect(appeui, appkey, force=False, timeout=JOIN_TIMEOUT, retry_sleep=JOIN_RETRY_SLEEP_MS, max_delay=30.,
+            device_class=LoRa.CLASS_C, on_event=event_handler, lora_obj=None, debug=False):
     """
     Create and connect Socket for LoRa application using OTAA mechanism
+    Device class and event callback (None to disable it) are configurable
+    An already initialized LoRa radio can be passed (lora_obj) instead of the shared one
+    Join progress is only logged in debug, a single summary is printed otherwise
     """
 
-    # Initialise LoRa in LORAWAN mode:
-    lora = LoRa(mode=LoRa.LORAWAN, region=LoRa.EU868, device_class=LoRa.CLASS_C)
+    # Log prefix (formatted once):
+    prefix = 'LORA-OTAA [EUI={}]: '.format(appeui)
+
+    # Initialise LoRa in LORAWAN mode (reuse radio if already initialized):
+    lora = lora_obj if lora_obj is not None else get_lora(device_class)
 
     #lora.nvram_erase()
     lora.nvram_restore()
@@ -46,46 +204,44 @@ def connect(appeui, appkey, force=False, max_retry=20, grace_period=2.5):
         # join a network using OTAA (Over the Air Activation)
         lora.join(activation=LoRa.OTAA, auth=(app_eui, app_key), timeout=0)
 
-    # wait until the module has joined the network
-    i = 0
+    # wait until the module has joined the network (exponential backoff, deepsleep on timeout)
+    t0 = utime.ticks_ms()
+    delay = 1.
+    waited = 0.
     while not lora.has_joined():
-        utime.sleep(grace_period)
-        i += 1
-        print('LORA-OTAA [EUI={}]: Application Join request pending ({}/{})...'.format(appeui, i, max_retry))
-        if i >= max_retry:
-            break
+        if waited >= timeout:
+            print(prefix + 'Application Join request timed out, retry in {}s'.format(retry_sleep//1000))
+            machine.deepsleep(retry_sleep)
+        # Sleep in short slices so the join accept is noticed as soon as it arrives:
+        deadline = utime.ticks_add(utime.ticks_ms(), int(delay*1000))
+        while utime.ticks_diff(deadline, utime.ticks_ms()) > 0 and not lora.has_joined():
+            utime.sleep_ms(JOIN_POLL_MS)
+        waited = utime.ticks_diff(utime.ticks_ms(), t0)/1000
+        delay = min(2*delay, max_delay)
+        if debug and not lora.has_joined():
+            print(prefix + 'Application Join request pending ({}/{}s)...'.format(waited, timeout))
     else:
-        print('LORA-OTAA [EUI={}]: Application Join request accepted'.format(appeui))
+        print(prefix + 'Application Join request accepted after {}s'.format(waited))
 
-    # Bind Event Callback:
-    lora.callback(trigger=(LoRa.RX_PACKET_EVENT | LoRa.TX_PACKET_EVENT), handler=event_handler)
+    # Create Socket:
+    sock = _open_socket(lora, on_event)
 
-    # Fake battery level (test):
-    lora.set_battery_level(127)
-
-    # create a LoRa socket
-    sock = socket.socket(socket.AF_LORA, socket.SOCK_RAW)
-
-    # set the LoRaWAN data rate
-    sock.setsockopt(socket.SOL_LORA, socket.SO_DR, 5)
-
-    # Confirmed uplink
-    sock.setsockopt(socket.SOL_LORA, socket.SO_CONFIRMED, False)
-
-    # make the socket blocking
-    # (waits for the data to be sent and for the 2 receive windows to expire)
+    # Send a single packet to confirm join and enable downlink capability, the socket is
+    # blocking for this one (waits for the data to be sent and for the 2 receive windows to expire)
+    # so the state saved below holds the updated frame counter:
     sock.setblocking(True)
-    sock.send(b'\x01')
-    # Send a single packet to confirm join and enable downlink capability
-    
-    # make the socket non-blocking
-    # (because if there's no data received it will block forever...)
-    sock.setblocking(False)
-    #sock.recv(64)
+    try:
+        sock.send(b'\x01')
+    except OSError as err:
+        print(prefix + 'Join confirmation not sent ({})'.format(err))
 
     # Save LoRa State:
     # https://forum.pycom.io/topic/1668/has-anyone-successfully-used-lora-nvram_save-and-restore/16
     lora.nvram_save()
-    print('LORA-OTAA [EUI={}]: LoRa state saved'.format(appeui))
+    if debug:
+        print(prefix + 'LoRa state saved')
+
+    # Back to non-blocking for the application (recv is polled in the loop):
+    sock.setblocking(False)
 
     return sock, lora
@@ -1,14 +1,9 @@
 #!/usr/bin/env python
 
-import json
-import binascii
-
 import pycom
 import machine
-import network
 
 import lora
-import logic
 
 # Start to blink:
 pycom.heartbeat(True)
@@ -22,30 +17,26 @@ else:
     print('DEVICE-BOOT: Started after a reset')
 
 # Detect device:
-eid = binascii.hexlify(network.LoRa().mac()).decode().upper()
+eid = lora.get_mac_hex()
 print("LORA-KEYS [EUI={}]: EUI detected".format(eid))
 
 # Node/Application Key:
-target = './data/lora.json'
-try:
-    with open(target) as fh:
-        creds = json.load(fh)
-except OSError:
-    creds = {eid: lora.generate_keys()}
-    print("LORA-KEYS: {}".format(json.dumps(creds)))
-    with open(target, 'w') as fh:
-        json.dump(creds, fh)
-keys = creds.get(eid)
+keys, generated = lora.load_creds('./data/lora.json', eid)
 
 # Create Socket:
-sock = None
+sock = _lora = None
 if keys:
-    sock, _lora = lora.connect(**keys, force=False)
+    # Resume the session saved in NVRAM, join only when there is none or keys were rotated:
+    res = None if generated else lora.fast_resume()
+    if res is None:
+        res = lora.connect(**keys, force=generated)
+    sock, _lora = res
     print("LORA-SOCKET: Created")
 
 # Stop to blink:
 pycom.heartbeat(False)
 
-# Create and start application:
+# Create and start application (sensors drivers are only loaded once LoRa is set up):
+import logic
 app = logic.Application(sock=sock, lora=_lora)
 app.start(lora_period=60*5, gps_timeout=10., debug=False, mode='power', dryrun=False)